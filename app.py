@@ -1,18 +1,31 @@
 import os
-import json
+import asyncio
 import logging
-from typing import Optional, List, Dict
-import requests
+import base64
+import hashlib
+import hmac
+import threading
+import time
+from bisect import bisect_right
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Optional, List, Dict, MutableMapping, Tuple
+from urllib.parse import quote
+import httpx
+import orjson
+from cachetools import TTLCache
 from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, ORJSONResponse
 from fastapi.templating import Jinja2Templates
 import msal
 
 # ------------------------
 # FastAPI app setup
 # ------------------------
-app = FastAPI(title="SharePoint / Data Lake API")
+app = FastAPI(title="SharePoint / Data Lake API", default_response_class=ORJSONResponse)
 templates = Jinja2Templates(directory="templates")
 
 @app.get("/privacy-policy", response_class=HTMLResponse)
@@ -30,6 +43,22 @@ DRIVE_ID = os.getenv("DRIVE_ID")
 AUTHORITY = f"https://login.microsoftonline.com/{TENANT_ID}"
 SCOPES = ["https://graph.microsoft.com/.default"]
 GRAPH_BASE = "https://graph.microsoft.com/v1.0"
+GRAPH_CONCURRENCY = int(os.getenv("GRAPH_CONCURRENCY", "32"))
+GRAPH_PAGE_SIZE = 999
+GRAPH_BATCH_SIZE = 20  # Graph's per-request limit for JSON batching
+# Sub-requests per $batch: small enough that several batches fit in the concurrency budget at once
+GRAPH_BATCH_CHUNK = max(1, min(GRAPH_BATCH_SIZE, GRAPH_CONCURRENCY // 2))
+GRAPH_MAX_RETRY_AFTER = 30  # longest Retry-After (seconds) we wait out before retrying a throttled call
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "120"))
+# Graph's pre-authenticated download URLs expire after about an hour; anything that holds on to
+# them past a TTL cache entry is refreshed at least this often (plus CACHE_TTL_SECONDS)
+DOWNLOAD_URL_REFRESH_SECONDS = int(os.getenv("DOWNLOAD_URL_REFRESH_SECONDS", "2700"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "50"))
+# Signs /list-files paging cursors; must be identical across workers
+CURSOR_SECRET = (os.getenv("CURSOR_SECRET") or CLIENT_SECRET or "").encode()
+# Only the driveItem fields the endpoints actually read; keeps Graph payloads small
+ITEM_SELECT = "id,name,folder,file,size,parentReference,@microsoft.graph.downloadUrl"
 
 # ------------------------
 # Logging & CORS setup
@@ -43,81 +72,490 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"]
 )
+# Listing and metadata JSON is highly repetitive; compress anything over 1 KB for clients that accept gzip
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+# ------------------------
+# Shared async HTTP client
+# ------------------------
+# One pool per process for Graph and download-URL traffic; HTTP/2 multiplexes
+# concurrent requests to the same host over a single TLS connection.
+http_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+    timeout=30
+)
+
+@app.on_event("shutdown")
+async def close_http_client():
+    await http_client.aclose()
+
+# Caps in-flight Graph requests across all concurrent traversals to stay under throttling limits.
+# A $batch holds one slot per sub-request, since Graph throttles sub-requests individually.
+_graph_free_slots = GRAPH_CONCURRENCY
+_graph_slots_changed = asyncio.Condition()
+
+@asynccontextmanager
+async def graph_slots(count: int = 1):
+    """
+    Hold `count` of the GRAPH_CONCURRENCY Graph slots. They are taken all at once when
+    enough are free, so a waiting batch never sits on slots a single GET could be using.
+    """
+    global _graph_free_slots
+    count = min(count, GRAPH_CONCURRENCY)
+    async with _graph_slots_changed:
+        await _graph_slots_changed.wait_for(lambda: _graph_free_slots >= count)
+        _graph_free_slots -= count
+    try:
+        yield
+    finally:
+        async with _graph_slots_changed:
+            _graph_free_slots += count
+            _graph_slots_changed.notify_all()
 
 # ------------------------
 # MSAL / Token helper
 # ------------------------
+_MSAL_APP: Optional[msal.ConfidentialClientApplication] = None
+_MSAL_LOCK = threading.Lock()
+
+def get_msal_app() -> msal.ConfidentialClientApplication:
+    """Return the process-wide MSAL app so its in-memory token cache is reused."""
+    global _MSAL_APP
+    if _MSAL_APP is None:
+        with _MSAL_LOCK:
+            if _MSAL_APP is None:
+                _MSAL_APP = msal.ConfidentialClientApplication(
+                    client_id=CLIENT_ID,
+                    authority=AUTHORITY,
+                    client_credential=CLIENT_SECRET
+                )
+    return _MSAL_APP
+
 def get_access_token() -> str:
-    """Acquire a token using client credentials flow."""
-    app_msal = msal.ConfidentialClientApplication(
-        client_id=CLIENT_ID,
-        authority=AUTHORITY,
-        client_credential=CLIENT_SECRET
-    )
-    result = app_msal.acquire_token_for_client(scopes=SCOPES)
+    """Acquire a token using client credentials flow (served from MSAL's cache until near expiry)."""
+    result = get_msal_app().acquire_token_for_client(scopes=SCOPES)
     if "access_token" not in result:
         logger.error("MSAL token error: %s", result)
         raise HTTPException(status_code=500, detail="Failed to acquire access token")
     return result["access_token"]
 
-def graph_get(url: str, token: str, params: dict = None) -> dict:
-    headers = {"Authorization": f"Bearer {token}", "Accept": "application/json"}
-    resp = requests.get(url, headers=headers, params=params, timeout=30)
+async def graph_send(url: str, token: str, params: dict = None, headers: dict = None) -> httpx.Response:
+    """GET from Graph under the shared semaphore, raising HTTPException on error statuses."""
+    request_headers = {"Authorization": f"Bearer {token}", "Accept": "application/json"}
+    if headers:
+        request_headers.update(headers)
+    async with graph_slots():
+        resp = await http_client.get(url, headers=request_headers, params=params)
     if resp.status_code >= 400:
         logger.error("Graph GET error %s: %s", resp.status_code, resp.text)
         raise HTTPException(status_code=resp.status_code, detail=resp.text)
-    return resp.json()
+    return resp
+
+async def graph_get(url: str, token: str, params: dict = None) -> dict:
+    resp = await graph_send(url, token, params)
+    return orjson.loads(resp.content)
+
+async def graph_get_all(url: str, token: str, params: dict = None) -> List[Dict]:
+    """GET a Graph collection, following @odata.nextLink until every page has been read."""
+    items = []
+    while url:
+        data = await graph_get(url, token, params)
+        items.extend(data.get("value", []))
+        # nextLink already carries the original query options
+        url = data.get("@odata.nextLink")
+        params = None
+    return items
+
+async def graph_batch(token: str, requests: List[Dict]) -> Dict[str, Dict]:
+    """POST up to GRAPH_BATCH_SIZE sub-requests to /$batch; returns the sub-responses keyed by id."""
+    headers = {"Authorization": f"Bearer {token}", "Accept": "application/json", "Content-Type": "application/json"}
+    async with graph_slots(len(requests)):
+        resp = await http_client.post(f"{GRAPH_BASE}/$batch", headers=headers, content=orjson.dumps({"requests": requests}))
+    if resp.status_code >= 400:
+        logger.error("Graph batch error %s: %s", resp.status_code, resp.text)
+        raise HTTPException(status_code=resp.status_code, detail=resp.text)
+    return {r["id"]: r for r in orjson.loads(resp.content).get("responses", [])}
+
+# ------------------------
+# In-process TTL caches (per worker)
+# ------------------------
+# Folder children keyed by ("children", drive_id, folder_id) and whole-drive trees by ("delta", drive_id);
+# path lookups by ("path", drive_id, path, select)
+listing_cache = TTLCache(maxsize=10_000, ttl=CACHE_TTL_SECONDS)
+path_cache = TTLCache(maxsize=10_000, ttl=CACHE_TTL_SECONDS)
+# Library folder prefix per drive, keyed by ("prefix", drive_id); fixed for the life of the process
+drive_prefix_cache: Dict[tuple, str] = {}
+# (etag, children) per single-page listing; outlives the listing TTL so an expired listing can be
+# revalidated with a 304, but not the download URLs it carries. A 304 never extends an entry.
+listing_validators = TTLCache(maxsize=10_000, ttl=DOWNLOAD_URL_REFRESH_SECONDS)
+_inflight: Dict[tuple, asyncio.Task] = {}
+
+async def cached(cache: MutableMapping, key: tuple, fetch):
+    """Cache-aside lookup; concurrent misses for the same key share a single fetch."""
+    try:
+        return cache[key]
+    except KeyError:
+        pass
+    task = _inflight.get(key)
+    if task is None:
+        task = _inflight[key] = asyncio.ensure_future(fetch())
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    # Shield so one cancelled caller doesn't abort the fetch for everyone else waiting on it
+    value = await asyncio.shield(task)
+    cache[key] = value
+    return value
 
 # ------------------------
 # Graph helpers
 # ------------------------
-def fetch_all_items(token: str, drive_id: str, folder_id: str = "root", path: str = "") -> List[Dict]:
-    """Recursively fetch all drive items starting from folder_id."""
-    all_items = []
+CHILDREN_PARAMS = {"$select": ITEM_SELECT, "$top": GRAPH_PAGE_SIZE}
+
+def _by_name(item: dict) -> str:
+    return item["name"]
+
+def _header(headers: MutableMapping, name: str) -> Optional[str]:
+    """Case-insensitive header lookup that also works on $batch sub-response headers (a plain dict)."""
+    name = name.lower()
+    return next((value for key, value in headers.items() if key.lower() == name), None)
+
+# Graph documents If-None-Match / 304 for GETs of a single driveItem, but not for /children
+# collections, and doesn't say those responses carry an ETag header. This revalidation only
+# kicks in when one is present; otherwise nothing is stored, no If-None-Match is ever sent,
+# and an expired listing is simply fetched again.
+async def _apply_listing_response(token: str, key: tuple, status: Optional[int], headers: MutableMapping,
+                                  body: dict, validator: Optional[tuple]) -> Optional[List[Dict]]:
+    """
+    Turn a /children response, direct or from $batch, into the folder's listing sorted by name:
+    a 304 reuses the validator's listing, a 200 reads any remaining pages and stores its ETag.
+    Returns None for any other status.
+    """
+    if status == 304 and validator:
+        return validator[1]
+    if status != 200:
+        return None
+
+    listing = body.get("value", [])
+    next_link = body.get("@odata.nextLink")
+    if next_link:
+        listing += await graph_get_all(next_link, token)
+    listing.sort(key=_by_name)
+    etag = _header(headers, "ETag")
+    # The ETag only covers the first page, so multi-page listings are never revalidated
+    if etag and not next_link:
+        listing_validators[key] = (etag, listing)
+    return listing
+
+async def fetch_children(token: str, drive_id: str, folder_id: str) -> List[Dict]:
+    """
+    GET the children of folder_id, sorted by name. If an earlier listing's ETag is known it is
+    sent as If-None-Match, and a 304 reuses that listing without downloading or parsing it again.
+    """
+    key = ("children", drive_id, folder_id)
+    validator = listing_validators.get(key)
     url = f"{GRAPH_BASE}/drives/{drive_id}/{folder_id}/children"
-    data = graph_get(url, token)
+    resp = await graph_send(url, token, CHILDREN_PARAMS, {"If-None-Match": validator[0]} if validator else None)
+    body = orjson.loads(resp.content) if resp.status_code != 304 else {}
+    return await _apply_listing_response(token, key, resp.status_code, resp.headers, body, validator)
 
-    for item in data.get("value", []):
-        current_path = f"{path}/{item['name']}".lstrip("/")
-        if "folder" in item:
-            all_items.append({
-                "type": "folder",
-                "name": item["name"],
-                "path": current_path,
-                "id": item["id"]
-            })
-            # Recurse into folder
-            all_items.extend(fetch_all_items(token, drive_id, f"items/{item['id']}", current_path))
+async def list_children(token: str, drive_id: str, folder_id: str) -> List[Dict]:
+    """Return the raw children of folder_id sorted by name, served from the listing cache when fresh."""
+    return await cached(listing_cache, ("children", drive_id, folder_id),
+                        lambda: fetch_children(token, drive_id, folder_id))
+
+async def list_children_many(token: str, drive_id: str, folder_ids: List[str]) -> List[List[Dict]]:
+    """
+    List several folders at once, each sorted by name. Cache hits are served locally; misses
+    are packed GRAPH_BATCH_CHUNK to a /$batch request, so one round-trip covers many folders.
+    """
+    listings: Dict[str, List[Dict]] = {}
+    misses = []
+    for folder_id in folder_ids:
+        listing = listing_cache.get(("children", drive_id, folder_id))
+        if listing is None:
+            misses.append(folder_id)
         else:
-            all_items.append({
-                "type": "file",
-                "name": item["name"],
-                "path": current_path,
-                "mimeType": item.get("file", {}).get("mimeType"),
-                "size_mb": round(item.get("size", 0) / (1024 * 1024), 2),
-                "downloadUrl": item.get("@microsoft.graph.downloadUrl"),
-                "id": item["id"]
-            })
+            listings[folder_id] = listing
+
+    query = httpx.QueryParams(CHILDREN_PARAMS)
+
+    async def fetch_chunk(chunk: List[str]):
+        requests = []
+        validators = []
+        for i, folder_id in enumerate(chunk):
+            request = {"id": str(i), "method": "GET", "url": f"/drives/{drive_id}/{folder_id}/children?{query}"}
+            validator = listing_validators.get(("children", drive_id, folder_id))
+            if validator:
+                request["headers"] = {"If-None-Match": validator[0]}
+            requests.append(request)
+            validators.append(validator)
+
+        responses = await graph_batch(token, requests)
+        retry = []
+        retry_after = 0
+        for i, (folder_id, validator) in enumerate(zip(chunk, validators)):
+            key = ("children", drive_id, folder_id)
+            sub = responses.get(str(i)) or {}
+            status = sub.get("status")
+            headers = sub.get("headers") or {}
+            listing = await _apply_listing_response(token, key, status, headers, sub.get("body") or {}, validator)
+            if listing is None:
+                retry.append(folder_id)
+                if status in (429, 503):
+                    try:
+                        retry_after = max(retry_after, int(_header(headers, "Retry-After") or 0))
+                    except ValueError:
+                        pass
+                continue
+            listing_cache[key] = listing
+            listings[folder_id] = listing
+
+        if retry:
+            # Throttled or failed sub-requests: wait out Retry-After, then retry each on its own
+            # so persistent errors surface via graph_get
+            await asyncio.sleep(min(retry_after, GRAPH_MAX_RETRY_AFTER))
+            for folder_id, listing in zip(retry, await asyncio.gather(
+                    *(list_children(token, drive_id, folder_id) for folder_id in retry))):
+                listings[folder_id] = listing
+
+    await asyncio.gather(*(fetch_chunk(misses[i:i + GRAPH_BATCH_CHUNK])
+                           for i in range(0, len(misses), GRAPH_BATCH_CHUNK)))
+    return [listings[folder_id] for folder_id in folder_ids]
+
+@dataclass(slots=True)
+class DriveEntry:
+    """One /list-files result. Slotted, so large listings don't carry a dict per item."""
+    type: str
+    name: str
+    path: str
+    id: str
+    mimeType: Optional[str] = None
+    size_mb: Optional[int] = None  # whole MiB, rounded down; exact bytes are in size
+    downloadUrl: Optional[str] = None
+    size: Optional[int] = None
+
+def drive_entry(item: dict, path: str) -> DriveEntry:
+    """Shape a raw Graph driveItem into the entry returned by /list-files. Runs once per item, so keep it lean."""
+    if "folder" in item:
+        return DriveEntry("folder", item["name"], path, item["id"])
+    get = item.get
+    file_facet = get("file")
+    size = get("size") or 0
+    return DriveEntry(
+        "file",
+        item["name"],
+        path,
+        item["id"],
+        file_facet.get("mimeType") if file_facet else None,
+        size >> 20,
+        get("@microsoft.graph.downloadUrl"),
+        size
+    )
+
+def walk_tree(children: Dict[str, List[Dict]], root_key: str, base_path: str) -> List[DriveEntry]:
+    """
+    Flatten a {parent_id: [raw children]} map depth-first, each folder followed by its subtree.
+    Uses an explicit stack of iterators rather than recursion, so depth is unbounded.
+    base_path must have no leading or trailing '/'.
+    """
+    all_items = []
+    # Hoist attribute lookups out of the per-item loop
+    append, get_children, entry = all_items.append, children.get, drive_entry
+    stack = [(base_path, iter(get_children(root_key, ())))]
+    while stack:
+        path, pending = stack[-1]
+        item = next(pending, None)
+        if item is None:
+            stack.pop()
+            continue
+        name = item["name"]
+        current_path = path + "/" + name if path else name
+        append(entry(item, current_path))
+        if "folder" in item:
+            stack.append((current_path, iter(get_children(item["id"], ()))))
     return all_items
 
+def _walk_page(frames: List[list], listings: Dict[str, List[Dict]], limit: int) -> Tuple[List[DriveEntry], List[str]]:
+    """
+    Advance frames in place through up to `limit` entries using only the listings at hand.
+    Returns the entries plus the folders whose listings were missing; a missing folder is
+    emitted but not descended into, so the page is only final when nothing is missing.
+    """
+    page = []
+    missing = []
+    while frames:
+        folder_id, path, after = frames[-1]
+        listing = listings[folder_id]
+        index = bisect_right(listing, after, key=_by_name) if after is not None else 0
+        if index >= len(listing):
+            frames.pop()
+            continue
+        if len(page) >= limit:
+            break
+
+        item = listing[index]
+        name = frames[-1][2] = item["name"]
+        current_path = path + "/" + name if path else name
+        page.append(drive_entry(item, current_path))
+        if "folder" in item:
+            child_id = f"items/{item['id']}"
+            if child_id in listings:
+                frames.append([child_id, current_path, None])
+            else:
+                missing.append(child_id)
+    return page, missing
+
+async def fetch_items_page(token: str, drive_id: str, frames: List[list], limit: int) -> Tuple[List[DriveEntry], List[list]]:
+    """
+    Resume a depth-first walk and return up to `limit` entries plus the frames to continue from.
+    Each frame is [folder_id, path, last_name] for a folder still being listed, outermost first,
+    where last_name is the last child returned from it (None before the first) and paths are free
+    of leading/trailing '/'. Resuming by name rather than position keeps pages consistent when a
+    listing is refetched with entries added or removed. The returned frames are empty once the
+    walk is exhausted.
+
+    Listings are fetched a level at a time: each round dry-runs the page on what is known and
+    lists every folder it reached but couldn't open in one list_children_many call, so a cold
+    page costs about one batched round-trip per level rather than one per folder.
+    """
+    folder_ids = [frame[0] for frame in frames]
+    listings = dict(zip(folder_ids, await list_children_many(token, drive_id, folder_ids)))
 
-def get_item_by_path(token: str, drive_id: str, path: str) -> dict:
+    while True:
+        trial = [list(frame) for frame in frames]
+        page, missing = _walk_page(trial, listings, limit)
+        if not missing:
+            return page, trial
+        listings.update(zip(missing, await list_children_many(token, drive_id, missing)))
+
+# Per-drive delta state: {"items": {item_id: raw driveItem}, "delta_link": str, "enumerated_at": monotonic secs}
+_delta_state: Dict[str, Dict] = {}
+
+async def sync_drive_delta(token: str, drive_id: str) -> Dict[str, Dict]:
+    """
+    Bring the in-memory snapshot of drive_id up to date via /root/delta.
+    The first call pages through the whole drive; later calls replay only the
+    changes since the stored deltaLink. Unchanged items are never re-sent by delta,
+    so the drive is re-enumerated every DOWNLOAD_URL_REFRESH_SECONDS to keep their
+    download URLs from expiring.
+    """
+    state = _delta_state.get(drive_id)
+    if state and time.monotonic() - state["enumerated_at"] >= DOWNLOAD_URL_REFRESH_SECONDS:
+        state = None
+    if state:
+        snapshot = dict(state["items"])
+        url, params = state["delta_link"], None
+        enumerated_at = state["enumerated_at"]
+    else:
+        snapshot = {}
+        url = f"{GRAPH_BASE}/drives/{drive_id}/root/delta"
+        params = {"$select": f"{ITEM_SELECT},root,deleted", "$top": GRAPH_PAGE_SIZE}
+        enumerated_at = time.monotonic()
+
+    delta_link = None
+    try:
+        while url:
+            data = await graph_get(url, token, params)
+            for item in data.get("value", []):
+                if "deleted" in item:
+                    snapshot.pop(item["id"], None)
+                else:
+                    snapshot[item["id"]] = item
+            params = None
+            url = data.get("@odata.nextLink")
+            delta_link = data.get("@odata.deltaLink", delta_link)
+    except HTTPException as e:
+        if state and e.status_code == 410:
+            # deltaLink expired or resync required: start over from a full enumeration
+            logger.info("Delta token for drive %s expired; resyncing", drive_id)
+            _delta_state.pop(drive_id, None)
+            return await sync_drive_delta(token, drive_id)
+        raise
+
+    # Only commit once every page has been applied, so a failed sync retries from the old link
+    _delta_state[drive_id] = {"items": snapshot, "delta_link": delta_link, "enumerated_at": enumerated_at}
+    return snapshot
+
+def path_key(path: str) -> List[str]:
+    """Sort key that orders a folder before its contents and siblings by name."""
+    return path.split("/")
+
+async def fetch_tree_delta(token: str, drive_id: str) -> List[DriveEntry]:
+    """
+    Fetch every item in the drive with a handful of delta pages instead of one call per folder.
+    Items come back sorted by path_key, so whole-drive pages can be keyed by path.
+    """
+    async def build() -> List[DriveEntry]:
+        snapshot = await sync_drive_delta(token, drive_id)
+        children: Dict[str, List[Dict]] = {}
+        root_id = None
+        for item in snapshot.values():
+            if "root" in item:
+                root_id = item["id"]
+            else:
+                children.setdefault(item.get("parentReference", {}).get("id"), []).append(item)
+
+        # Rebuild paths from parentReference depth-first; with siblings in name order the
+        # walk comes out sorted by path_key
+        for listing in children.values():
+            listing.sort(key=lambda item: item["name"])
+        return walk_tree(children, root_id, "")
+
+    return await cached(listing_cache, ("delta", drive_id), build)
+
+
+async def drive_root_prefix(token: str, drive_id: str) -> str:
+    """
+    Return 'Documents' if the drive keeps its files under a top-level Documents
+    folder (SharePoint libraries exposed that way), else ''. Probed once per process.
+    """
+    async def probe() -> str:
+        try:
+            item = await graph_get(f"{GRAPH_BASE}/drives/{drive_id}/root:/Documents:", token, {"$select": "id,folder"})
+        except HTTPException as e:
+            if e.status_code == 404:
+                return ""
+            raise
+        return "Documents" if "folder" in item else ""
+
+    return await cached(drive_prefix_cache, ("prefix", drive_id), probe)
+
+async def get_item_by_path(token: str, drive_id: str, path: str, select: Optional[str] = None) -> dict:
     """
     Use Graph path addressing: /drives/{driveId}/root:/{path}:
-    Automatically prepends 'Documents/' if not present (for SharePoint).
+    Prepends the drive's 'Documents/' folder when it has one and the path doesn't already include it.
+    Pass `select` to fetch only the fields the caller needs.
     """
-    safe_path = path.lstrip("/")
-    if not safe_path.startswith("Documents/"):
-        safe_path = f"Documents/{safe_path}"
+    safe_path = path.strip("/")
+    prefix = await drive_root_prefix(token, drive_id)
+    if prefix and safe_path != prefix and not safe_path.startswith(f"{prefix}/"):
+        safe_path = f"{prefix}/{safe_path}" if safe_path else prefix
 
     url = f"{GRAPH_BASE}/drives/{drive_id}/root:/{safe_path}:"
-    headers = {"Authorization": f"Bearer {token}", "Accept": "application/json"}
-    resp = requests.get(url, headers=headers, timeout=30)
+    params = {"$select": select} if select else None
+    return await cached(path_cache, ("path", drive_id, safe_path, select), lambda: graph_get(url, token, params))
 
-    if resp.status_code >= 400:
-        logger.error("Graph GET error %s: %s", resp.status_code, resp.text)
-        raise HTTPException(status_code=resp.status_code, detail=resp.text)
-    return resp.json()
+# ------------------------
+# Pagination cursors
+# ------------------------
+def _cursor_signature(payload: bytes) -> bytes:
+    digest = hmac.new(CURSOR_SECRET, payload, hashlib.sha256).digest()[:16]
+    return base64.urlsafe_b64encode(digest).rstrip(b"=")
+
+def encode_cursor(state: dict) -> str:
+    """Pack paging state into an opaque, HMAC-signed, URL-safe token."""
+    payload = base64.urlsafe_b64encode(orjson.dumps(state)).rstrip(b"=")
+    return (payload + b"." + _cursor_signature(payload)).decode()
+
+def decode_cursor(cursor: str) -> dict:
+    """Verify and unpack a cursor from encode_cursor."""
+    try:
+        payload, signature = cursor.encode().split(b".")
+        if not hmac.compare_digest(signature, _cursor_signature(payload)):
+            raise ValueError("bad signature")
+        return orjson.loads(base64.urlsafe_b64decode(payload + b"=" * (-len(payload) % 4)))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 # ------------------------
 # API Endpoints
@@ -126,44 +564,72 @@ def get_item_by_path(token: str, drive_id: str, path: str) -> dict:
 def root():
     return {"status": "ok", "message": "Data Lake API running"}
 
-@app.get("/list-files", summary="List files recursively in folder (or root)")
-def list_files(folder: Optional[str] = Query(None, description="Folder path under root; e.g. CASE_STUDIES or nested/path")):
-    token = get_access_token()
-    if not folder:
-        items = fetch_all_items(token, DRIVE_ID, folder_id="root", path="")
-        return {"count": len(items), "items": items}
+@app.get("/list-files", summary="List files recursively in folder (or root), one page at a time")
+async def list_files(
+    folder: Optional[str] = Query(None, description="Folder path under root; e.g. CASE_STUDIES or nested/path"),
+    limit: int = Query(200, ge=1, le=5000, description="Maximum number of items per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page; resumes that listing (folder is ignored)")
+):
+    token = await run_in_threadpool(get_access_token)
+    state = decode_cursor(cursor) if cursor else {"after": None} if not folder else None
+
+    if state is not None and "after" in state:
+        # Whole drive: page through the delta-synced snapshot keyed by the last path returned,
+        # so pages stay consistent across snapshot rebuilds and workers
+        items = await fetch_tree_delta(token, DRIVE_ID)
+        start = bisect_right(items, path_key(state["after"]), key=lambda entry: path_key(entry.path)) if state["after"] else 0
+        page = items[start:start + limit]
+        next_state = {"after": page[-1].path} if start + limit < len(items) else None
+    else:
+        if state is not None:
+            frames = state.get("walk")
+            if frames is None:
+                # e.g. a cursor issued before pages were keyed by path or name
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+        else:
+            try:
+                item = await get_item_by_path(token, DRIVE_ID, folder, select="id,folder,file")
+            except HTTPException as e:
+                raise HTTPException(status_code=404, detail=f"Folder '{folder}' not found: {e.detail}")
 
-    try:
-        item = get_item_by_path(token, DRIVE_ID, folder)
-    except HTTPException as e:
-        raise HTTPException(status_code=404, detail=f"Folder '{folder}' not found: {e.detail}")
+            if "file" in item and "folder" not in item:
+                raise HTTPException(status_code=400, detail=f"'{folder}' is a file, not a folder")
+            # Normalise once here so the per-item path join needs no stripping
+            frames = [[f"items/{item['id']}", folder.strip("/"), None]]
 
-    if "file" in item and "folder" not in item:
-        raise HTTPException(status_code=400, detail=f"'{folder}' is a file, not a folder")
+        page, frames = await fetch_items_page(token, DRIVE_ID, frames, limit)
+        next_state = {"walk": frames} if frames else None
 
-    folder_id = item["id"]
-    items = fetch_all_items(token, DRIVE_ID, folder_id=f"items/{folder_id}", path=folder)
-    return {"count": len(items), "items": items}
+    # Return the response directly: orjson serializes DriveEntry dataclasses natively,
+    # skipping FastAPI's per-item jsonable_encoder pass
+    return ORJSONResponse({
+        "count": len(page),
+        "items": page,
+        "next_cursor": encode_cursor(next_state) if next_state else None
+    })
 
 
 @app.get("/metadata", summary="Load metadata from SharePoint or local fallback")
-def metadata(file_path: Optional[str] = Query(None, description="metadata.json path")):
-    token = get_access_token()
+async def metadata(file_path: Optional[str] = Query(None, description="metadata.json path")):
+    token = await run_in_threadpool(get_access_token)
     try:
         if file_path:
             # Try to fetch from SharePoint
-            item = get_item_by_path(token, DRIVE_ID, file_path)
+            item = await get_item_by_path(token, DRIVE_ID, file_path, select="id,@microsoft.graph.downloadUrl")
             download_url = item.get("@microsoft.graph.downloadUrl")
             if download_url:
-                resp = requests.get(download_url, timeout=30)
-                resp.raise_for_status()
-                return {"file_path": file_path, "metadata": json.loads(resp.text)}
+                # Stream the body into a single bytes buffer; orjson parses bytes directly, no decode pass.
+                # Unlike requests, httpx doesn't follow redirects unless asked, and download URLs may redirect
+                async with http_client.stream("GET", download_url, follow_redirects=True) as resp:
+                    resp.raise_for_status()
+                    body = await resp.aread()
+                return ORJSONResponse({"file_path": file_path, "metadata": orjson.loads(body)})
 
         # ✅ Local fallback
         if os.path.exists("metadata.json"):
-            with open("metadata.json", "r", encoding="utf-8") as f:
-                data = json.load(f)
-            return {"file_path": "local/metadata.json", "metadata": data}
+            with open("metadata.json", "rb") as f:
+                data = orjson.loads(f.read())
+            return ORJSONResponse({"file_path": "local/metadata.json", "metadata": data})
 
         raise HTTPException(status_code=404, detail="metadata.json not found locally or in SharePoint")
 
@@ -173,18 +639,20 @@ def metadata(file_path: Optional[str] = Query(None, description="metadata.json p
 
 
 @app.get("/download", summary="Return a file's direct download URL")
-def download(file_path: str = Query(..., description="Full path under root, e.g. CASE_STUDIES/abc.pdf")):
-    token = get_access_token()
+async def download(file_path: str = Query(..., description="Full path under root, e.g. CASE_STUDIES/abc.pdf")):
+    token = await run_in_threadpool(get_access_token)
     try:
-        item = get_item_by_path(token, DRIVE_ID, file_path)
+        # Selecting the download URL explicitly makes Graph return it on the path lookup itself
+        item = await get_item_by_path(token, DRIVE_ID, file_path, select="id,@microsoft.graph.downloadUrl")
         download_url = item.get("@microsoft.graph.downloadUrl")
 
         if not download_url:
+            # Rare: fall back to a direct item fetch
             item_id = item.get("id")
             if not item_id:
                 raise HTTPException(status_code=404, detail="Item not found")
 
-            item2 = graph_get(f"{GRAPH_BASE}/drives/{DRIVE_ID}/items/{item_id}", token)
+            item2 = await graph_get(f"{GRAPH_BASE}/drives/{DRIVE_ID}/items/{item_id}", token)
             download_url = item2.get("@microsoft.graph.downloadUrl")
 
             if not download_url:
@@ -200,14 +668,28 @@ def download(file_path: str = Query(..., description="Full path under root, e.g.
 
 
 @app.get("/search", summary="Search items by query")
-def search(q: str = Query(..., description="Search term (file/folder name)")):
-    token = get_access_token()
-    url = f"{GRAPH_BASE}/drives/{DRIVE_ID}/root/search(q='{q}')"
-    data = graph_get(url, token)
-    hits = data.get("value", [])
+async def search(
+    q: str = Query(..., description="Search term (file/folder name)"),
+    limit: int = Query(25, ge=1, le=200, description="Maximum number of results to return"),
+    offset: int = Query(0, ge=0, le=1000, description="Number of results to skip (Graph search can only page forward)")
+):
+    token = await run_in_threadpool(get_access_token)
+    # Escape quotes for the OData string literal, then percent-encode the whole term
+    term = quote(q.replace("'", "''"), safe="")
+    url = f"{GRAPH_BASE}/drives/{DRIVE_ID}/root/search(q='{term}')"
+    params = {"$select": ITEM_SELECT, "$top": min(offset + limit, GRAPH_PAGE_SIZE)}
+
+    # Graph search has no $skip, so read pages until the requested window is covered
+    hits = []
+    while url and len(hits) < offset + limit:
+        data = await graph_get(url, token, params)
+        hits.extend(data.get("value", []))
+        url = data.get("@odata.nextLink")
+        params = None
+    has_more = bool(url) or len(hits) > offset + limit
 
     results = []
-    for item in hits:
+    for item in hits[offset:offset + limit]:
         parent_ref = item.get("parentReference", {})
         results.append({
             "id": item.get("id"),
@@ -216,6 +698,25 @@ def search(q: str = Query(..., description="Search term (file/folder name)")):
             "type": "folder" if item.get("folder") else "file",
             "downloadUrl": item.get("@microsoft.graph.downloadUrl")
         })
-    return {"count": len(results), "results": results}
+    return {
+        "count": len(results),
+        "results": results,
+        "next_offset": offset + limit if has_more else None
+    }
 
 
+# ------------------------
+# Entrypoint
+# ------------------------
+if __name__ == "__main__":
+    import uvicorn
+
+    # Each worker is its own process with its own MSAL app, HTTP pool and caches
+    uvicorn.run(
+        "app:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        loop="uvloop",
+        http="httptools"
+    )
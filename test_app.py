@@ -0,0 +1,203 @@
+"""
+Checks for /list-files paging, cursors, $batch retries and ETag revalidation, run against an
+in-memory drive served through httpx.MockTransport, so no tenant or network is needed.
+Run with `python -m pytest` from this directory.
+"""
+import asyncio
+import base64
+import itertools
+import re
+
+import httpx
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+
+
+class FakeDrive:
+    """Just enough of Graph's drive API for app.py: paged /children, $batch, /root/delta and path lookups."""
+    PAGE_SIZE = 4
+
+    def __init__(self):
+        self.items = {"root": {"id": "root", "name": "root", "root": {}, "folder": {}}}
+        self.ids = itertools.count(1)
+        self.throttle = 0  # answer this many upcoming $batch sub-requests with 429
+        self.log = []  # ("batch" or "get", status) for every Graph GET served, $batch sub-requests included
+
+    def add(self, parent: str, name: str, folder: bool = False) -> str:
+        item_id = f"id{next(self.ids)}"
+        item = {"id": item_id, "name": name, "parentReference": {"id": parent}}
+        if folder:
+            item["folder"] = {}
+        else:
+            item.update({"file": {"mimeType": "text/plain"}, "size": 1,
+                         "@microsoft.graph.downloadUrl": f"https://dl.example/{item_id}"})
+        self.items[item_id] = item
+        return item_id
+
+    def children(self, parent: str) -> list:
+        return [item for item in self.items.values() if item.get("parentReference", {}).get("id") == parent]
+
+    def page(self, url: httpx.URL, items: list) -> dict:
+        skip = int(url.params.get("$skiptoken", 0))
+        body = {"value": items[skip:skip + self.PAGE_SIZE]}
+        if skip + self.PAGE_SIZE < len(items):
+            body["@odata.nextLink"] = str(url.copy_merge_params({"$skiptoken": skip + self.PAGE_SIZE}))
+        return body
+
+    def respond(self, method: str, url: httpx.URL, headers: dict) -> tuple:
+        path = url.path
+        match = re.search(r"/drives/[^/]+/(?:root|items/([^/]+))/children$", path)
+        if match:
+            listing = self.children(match.group(1) or "root")
+            etag = '"%x"' % hash(tuple((item["id"], item["name"]) for item in listing))
+            if headers.get("If-None-Match") == etag and "$skiptoken" not in url.params:
+                return 304, {"ETag": etag}, None
+            return 200, {"ETag": etag}, self.page(url, listing)
+
+        if path.endswith("/root/delta"):
+            if "token" in url.params:
+                return 200, {}, {"value": [], "@odata.deltaLink": str(url)}
+            body = self.page(url, list(self.items.values()))
+            if "@odata.nextLink" not in body:
+                body["@odata.deltaLink"] = str(url.copy_with(params={"token": "1"}))
+            return 200, {}, body
+
+        match = re.search(r"/drives/[^/]+/root:/(.*):$", path)
+        if match:
+            item = self.items["root"]
+            for name in match.group(1).split("/"):
+                item = next((child for child in self.children(item["id"]) if child["name"] == name), None)
+                if item is None:
+                    return 404, {}, {"error": {"code": "itemNotFound"}}
+            return 200, {}, item
+        return 404, {}, {"error": {"code": "invalidRequest"}}
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/$batch"):
+            responses = []
+            for sub in orjson.loads(request.content)["requests"]:
+                if self.throttle:
+                    self.throttle -= 1
+                    status, headers, body = 429, {"Retry-After": "0"}, {"error": {"code": "TooManyRequests"}}
+                else:
+                    status, headers, body = self.respond(sub["method"], httpx.URL(app.GRAPH_BASE + sub["url"]),
+                                                         sub.get("headers", {}))
+                self.log.append(("batch", status))
+                responses.append({"id": sub["id"], "status": status, "headers": headers, "body": body})
+            return httpx.Response(200, json={"responses": responses})
+
+        status, headers, body = self.respond(request.method, request.url, request.headers)
+        self.log.append(("get", status))
+        return httpx.Response(status, headers=headers, json=body) if body is not None else httpx.Response(status, headers=headers)
+
+
+@pytest.fixture
+def drive(monkeypatch):
+    """A drive with nested folders and listings that span several Graph pages."""
+    fake = FakeDrive()
+    docs = fake.add("root", "Docs", folder=True)
+    for name in ("c.txt", "a.txt", "e.txt", "b.txt", "d.txt", "f.txt"):
+        fake.add(docs, name)
+    sub = fake.add(docs, "Sub", folder=True)
+    for name in ("y.txt", "x.txt"):
+        fake.add(sub, name)
+    deep = fake.add(sub, "Deep", folder=True)
+    fake.add(deep, "z.txt")
+    fake.add("root", "top.txt")
+
+    monkeypatch.setattr(app, "http_client", httpx.AsyncClient(transport=httpx.MockTransport(fake.handler)))
+    monkeypatch.setattr(app, "get_access_token", lambda: "token")
+    monkeypatch.setattr(app, "DRIVE_ID", "drive")
+    # Module-level state would otherwise leak between tests (and event loops)
+    monkeypatch.setattr(app, "_graph_slots_changed", asyncio.Condition())
+    for cache in (app.listing_cache, app.path_cache, app.drive_prefix_cache, app.listing_validators, app._delta_state):
+        cache.clear()
+    return fake
+
+
+@pytest.fixture
+def client(drive):
+    with TestClient(app.app) as test_client:
+        yield test_client
+
+
+def read_all_pages(client: TestClient, params: dict) -> list:
+    response = client.get("/list-files", params=params).json()
+    paths = [item["path"] for item in response["items"]]
+    while response["next_cursor"]:
+        response = client.get("/list-files", params={**params, "cursor": response["next_cursor"]}).json()
+        paths += [item["path"] for item in response["items"]]
+    return paths
+
+
+# ------------------------
+# Paging
+# ------------------------
+@pytest.mark.parametrize("folder", ["Docs", None])
+@pytest.mark.parametrize("limit", [1, 3, 7])
+def test_pages_match_unpaged_walk(client, folder, limit):
+    params = {"folder": folder} if folder else {}
+    unpaged = client.get("/list-files", params={**params, "limit": 5000}).json()
+    assert unpaged["next_cursor"] is None
+    expected = [item["path"] for item in unpaged["items"]]
+    assert len(expected) == (11 if folder else 13)
+    assert read_all_pages(client, {**params, "limit": limit}) == expected
+
+
+def test_folder_pages_survive_listing_changes(client, drive):
+    first = client.get("/list-files", params={"folder": "Docs", "limit": 7}).json()
+    assert [item["path"] for item in first["items"]][-2:] == ["Docs/a.txt", "Docs/b.txt"]
+
+    # a.txt, already returned, goes away and the listing is refetched before the next page
+    del drive.items[next(item["id"] for item in drive.items.values() if item["name"] == "a.txt")]
+    app.listing_cache.clear()
+
+    rest = read_all_pages(client, {"folder": "Docs", "limit": 7, "cursor": first["next_cursor"]})
+    assert rest == ["Docs/c.txt", "Docs/d.txt", "Docs/e.txt", "Docs/f.txt"]
+
+
+# ------------------------
+# Cursors
+# ------------------------
+def test_tampered_cursor_is_rejected(client):
+    cursor = client.get("/list-files", params={"folder": "Docs", "limit": 2}).json()["next_cursor"]
+    payload, signature = cursor.split(".")
+    forged = base64.urlsafe_b64encode(orjson.dumps({"walk": [["items/other", "", None]]})).rstrip(b"=").decode()
+
+    for bad in (f"{forged}.{signature}", f"{payload}.{signature[::-1]}", "not-a-cursor"):
+        response = client.get("/list-files", params={"cursor": bad})
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid cursor"
+
+
+# ------------------------
+# $batch and ETag revalidation
+# ------------------------
+def test_throttled_batch_subrequests_are_retried(drive):
+    folder_ids = [f"items/{item['id']}" for item in drive.items.values() if "folder" in item and "root" not in item]
+    expected = [sorted(item["name"] for item in drive.children(folder_id.split("/")[1])) for folder_id in folder_ids]
+    drive.throttle = 2
+
+    listings = asyncio.run(app.list_children_many("token", "drive", folder_ids))
+
+    assert [[item["name"] for item in listing] for listing in listings] == expected
+    # Docs and Sub are throttled and fetched again on their own; Docs spans two pages
+    assert drive.log == [("batch", 429), ("batch", 429), ("batch", 200)] + [("get", 200)] * 3
+
+
+def test_not_modified_reuses_stored_listing(drive):
+    sub = next(item["id"] for item in drive.items.values() if item["name"] == "Sub")
+    folder_id = f"items/{sub}"
+
+    first = asyncio.run(app.list_children("token", "drive", folder_id))
+    assert ("children", "drive", folder_id) in app.listing_validators
+
+    # Once the listing expires, both a direct GET and a $batch sub-request revalidate with a 304
+    app.listing_cache.clear()
+    assert asyncio.run(app.list_children("token", "drive", folder_id)) is first
+    app.listing_cache.clear()
+    assert asyncio.run(app.list_children_many("token", "drive", [folder_id])) == [first]
+    assert drive.log == [("get", 200), ("get", 304), ("batch", 304)]